@@ -1,15 +1,25 @@
-\
 import os
+import sys
 import json
 import asyncio
+import functools
 import logging
+import random
+import tempfile
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-import pytz
+from zoneinfo import ZoneInfo
 
 import aiohttp
 import discord
 from discord.ext import commands, tasks
 
+try:
+    import orjson
+except ImportError:  # optional, faster JSON for API responses and state files
+    orjson = None
+
 # ------------------ Logging ------------------
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 log = logging.getLogger("bot")
@@ -28,6 +38,11 @@ if not ROBLOX_COOKIE:
 if not ROBLOX_USER_ID:
     log.critical("ROBLOX_USER_ID environment variable is not set. Exiting.")
     raise SystemExit(1)
+try:
+    ROBLOX_USER_ID_INT = int(ROBLOX_USER_ID)
+except ValueError:
+    log.critical("ROBLOX_USER_ID must be a numeric user id. Exiting.")
+    raise SystemExit(1)
 
 # Config file (channel ids)
 CONFIG_PATH = "config.json"
@@ -55,9 +70,9 @@ if not os.path.exists(PLAYERS_PATH):
 
 with open(PLAYERS_PATH, "r") as f:
     try:
-        manual_tracked = json.load(f)
+        manual_tracked = set(int(x) for x in json.load(f))  # {userId}
     except Exception:
-        manual_tracked = []
+        manual_tracked = set()
 
 # State file to persist status message id across restarts (optional)
 STATE_PATH = "state.json"
@@ -69,30 +84,82 @@ if os.path.exists(STATE_PATH):
     except Exception:
         state = {}
 
+# Username cache persisted across restarts (usernames rarely change)
+USERNAMES_PATH = "usernames.json"
+username_cache = {}  # {userId: (username, time.time() when fetched)}
+if os.path.exists(USERNAMES_PATH):
+    try:
+        with open(USERNAMES_PATH, "r") as f:
+            username_cache = {
+                int(k): (v, 0.0) if isinstance(v, str) else (v[0], float(v[1]))
+                for k, v in json.load(f).items()
+            }
+    except Exception:
+        username_cache = {}
+
 # ------------------ Bot & Globals ------------------
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-JAKARTA = pytz.timezone("Asia/Jakarta")
+JAKARTA = ZoneInfo("Asia/Jakarta")
 START_TIME = datetime.now(JAKARTA)
 RESTART_INTERVAL = 12 * 60 * 60  # seconds
-UPDATE_INTERVAL = 5  # seconds to edit status message
+RESTART_WARNING = 300  # seconds before the restart to post a warning
+UPDATE_INTERVAL = 5  # seconds between presence polls while someone is online
+IDLE_UPDATE_INTERVAL = 20  # seconds between presence polls while nobody is online
+STATUS_REFRESH_INTERVAL = 30  # max seconds between status message edits when nothing changed
+RENDER_OFFLOAD_THRESHOLD = 200  # online friends above which the status box is rendered in a thread
 BAR_LENGTH = 20
+_FILL = "█" * BAR_LENGTH
+_EMPTY = "░" * BAR_LENGTH
+_STATUS_TEMPLATE = (
+    "╔════════════ 📊 STATUS BOT ════════════╗\n"
+    "║ ⏳ Uptime        : {uptime:<20}║\n"
+    "║ 👥 Teman Online  : {online:<20}║\n"
+    "║ 🕒 Update Terakhir: {last_update:<20}║\n"
+    "║ 🔄 Restart Dalam : {remaining:<20}║\n"
+    "║ [{bar}]                 ║\n"
+    "╚═══════════════════════════════════════╝\n\n"
+    "🎮 **DAFTAR TEMAN ONLINE**\n{friends}"
+)
+FRIENDS_CACHE_TTL = 600  # seconds before the friends list is fetched again
+USERNAME_CACHE_TTL = 24 * 60 * 60  # seconds before a cached username is fetched again
+HTTP_MAX_ATTEMPTS = 3
+HTTP_MAX_RETRY_AFTER = 30  # seconds; longer Retry-After values skip the retry and leave it to the next poll
+NOTIF_SEND_GAP = 1.0  # seconds between queued notif sends (Discord allows 5 msg / 5s per channel)
 
 status_message_id = state.get("status_message_id")
+_last_persisted_mid = status_message_id
 
 # Presence tracking
-online_since = {}   # {userId: datetime when observed online}
-game_since = {}     # {userId: datetime when observed in-game}
-last_online_set = set()
+@dataclass(slots=True)
+class PresenceState:
+    online_since: datetime | None = None  # when observed online
+    game_since: datetime | None = None    # when observed in-game
+    was_online: bool = False              # online as of the previous poll
+
+state_by_uid = {}  # {userId: PresenceState}; ids missing from a presence response keep their state
+last_presence_hash = None
+online_display = []  # [(name, online_since, lastLocation, game_since)] for the renderer
+update_event = asyncio.Event()  # set by presence_poller when the status message needs a redraw
+last_edit_ts = time.monotonic()  # when status_renderer last rebuilt the status message
+notif_queue = asyncio.Queue(maxsize=100)  # send() kwargs for the notif channel, drained by notif_sender
+
+# Roblox lookup caches
+_friends_cache = {"ids": [], "expires": 0.0, "ok": False}  # expires is time.monotonic() based; ok = last fetch succeeded
+_usernames_dirty = False  # username_cache has entries not yet written to USERNAMES_PATH
 
 # aiohttp session (created on_ready)
 http_session = None
+restart_task = None  # _schedule_restart task (created on_ready)
 
 # ------------------ Helper functions ------------------
 def format_timedelta(td: timedelta) -> str:
-    secs = int(td.total_seconds())
+    return _fmt_secs(int(td.total_seconds()))
+
+@functools.lru_cache(maxsize=8192)
+def _fmt_secs(secs: int) -> str:
     hours, rem = divmod(secs, 3600)
     minutes, seconds = divmod(rem, 60)
     if hours:
@@ -104,175 +171,349 @@ def format_timedelta(td: timedelta) -> str:
 def now_wib() -> datetime:
     return datetime.now(JAKARTA)
 
-async def chunked(iterable, n=100):
+def _json_loads(raw):
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def _json_dumps(data, indent=None) -> bytes:
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option)
+    return json.dumps(data, indent=indent).encode()
+
+def _write_json_atomic(path, data, indent=None):
+    """Write JSON to path via a temp file + os.replace so readers never see a partial file.
+
+    Each call gets its own temp file, so concurrent writers to the same path can't clobber each other.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_json_dumps(data, indent=indent))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _embed_field_value(lines, limit=1024):
+    """Join lines for an embed field, cutting off with a '+N lainnya' note at Discord's 1024 char limit."""
+    out = []
+    size = 0
+    for idx, line in enumerate(lines):
+        more = f"… +{len(lines) - idx} lainnya"
+        reserve = len(more) + 1 if idx < len(lines) - 1 else 0
+        if size + len(line) + reserve > limit:
+            out.append(more)
+            break
+        out.append(line)
+        size += len(line) + 1
+    return "\n".join(out)
+
+def chunked(iterable, n=100):
     for i in range(0, len(iterable), n):
         yield iterable[i:i + n]
 
 # ------------------ Roblox API calls ------------------
+async def _req(method, url, **kw):
+    """Do an HTTP request with retries on 429/5xx/network errors.
+
+    Returns (status, json data or None); status is None if the last attempt failed without a response.
+    """
+    status = None
+    for attempt in range(HTTP_MAX_ATTEMPTS):
+        try:
+            async with http_session.request(method, url, **kw) as resp:
+                status = resp.status
+                if status == 200:
+                    return status, _json_loads(await resp.read())
+                retry_after = resp.headers.get("Retry-After")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning(f"Request to {url} failed: {e!r}")
+            status = None
+        if attempt == HTTP_MAX_ATTEMPTS - 1:
+            break
+        if status is None or status >= 500:
+            await asyncio.sleep(2 ** attempt * 0.5 + random.random() * 0.25)
+        elif status == 429:
+            try:
+                delay = max(float(retry_after), 0.0)
+            except (TypeError, ValueError):
+                delay = 2 ** attempt * 0.5
+            if delay > HTTP_MAX_RETRY_AFTER:
+                log.warning(f"Rate limited by {url} for {delay:.0f}s, giving up until the next poll")
+                break
+            log.warning(f"Rate limited by {url}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay + random.random() * 0.25)
+        else:
+            break
+    return status, None
+
 async def get_friends_list():
-    \"\"\"Return list of friends' userIds (from account owning the cookie).\"\"\"
+    """Return list of friends' userIds (from account owning the cookie).
+
+    The list is cached for FRIENDS_CACHE_TTL seconds; use !refreshfriends to force a refetch.
+    If a fetch fails the previous (stale) list is returned and the fetch is retried next call.
+    """
+    if time.monotonic() < _friends_cache["expires"]:
+        return _friends_cache["ids"]
     url = "https://friends.roblox.com/v1/my/friends"
     friends = []
     cursor = None
-    headers = {"Cookie": f".ROBLOSECURITY={ROBLOX_COOKIE}", "User-Agent": "DiscordRobloxBot/1.0"}
+    headers = {"Cookie": f".ROBLOSECURITY={ROBLOX_COOKIE}"}
 
     while True:
         params = {"limit": 100}
         if cursor:
             params["cursor"] = cursor
-        async with http_session.get(url, headers=headers, params=params) as resp:
-            if resp.status != 200:
-                log.warning(f"Failed to fetch friends list: {resp.status}")
-                return []
-            data = await resp.json()
+        status, data = await _req("GET", url, headers=headers, params=params)
+        if data is None:
+            log.warning(f"Failed to fetch friends list: {status}")
+            _friends_cache["ok"] = False
+            return _friends_cache["ids"]
         for item in data.get("data", []):
             friends.append(item.get("id"))
         cursor = data.get("nextPageCursor")
         if not cursor:
             break
+    _friends_cache["ids"] = friends
+    _friends_cache["ok"] = True
+    _friends_cache["expires"] = time.monotonic() + FRIENDS_CACHE_TTL
     return friends
 
 async def get_presences(user_ids):
-    \"\"\"Return presence objects for provided user ids (list of ints).\"\"\"
+    """Return presence objects for provided user ids (list of ints)."""
     if not user_ids:
         return []
     url = "https://presence.roblox.com/v1/presence/users"
-    headers = {"Content-Type": "application/json", "Cookie": f".ROBLOSECURITY={ROBLOX_COOKIE}", "User-Agent": "DiscordRobloxBot/1.0"}
+    headers = {"Content-Type": "application/json", "Cookie": f".ROBLOSECURITY={ROBLOX_COOKIE}"}
     results = []
-    for chunk in await chunked(list(user_ids), 100):
+    for chunk in chunked(list(user_ids), 100):
         payload = {"userIds": chunk}
-        async with http_session.post(url, headers=headers, json=payload) as resp:
-            if resp.status != 200:
-                log.warning(f"Failed presence check (status {resp.status})")
-                continue
-            data = await resp.json()
-            results.extend(data.get("userPresences", []))
+        status, data = await _req("POST", url, headers=headers, json=payload)
+        if data is None:
+            log.warning(f"Failed presence check (status {status})")
+            continue
+        results.extend(data.get("userPresences", []))
     return results
 
 async def get_usernames(user_ids):
-    \"\"\"Batch get usernames for ids via users API. Returns dict id->username.\"\"\"
-    res = {}
+    """Batch get usernames for ids via users API. Returns dict id->username.
+
+    Only ids missing from username_cache or older than USERNAME_CACHE_TTL are requested;
+    if that request fails the stale name is still returned.
+    """
+    global _usernames_dirty
+    expired_before = time.time() - USERNAME_CACHE_TTL
+    missing = [uid for uid in user_ids if uid not in username_cache or username_cache[uid][1] < expired_before]
+    fetched_at = time.time()
     url = "https://users.roblox.com/v1/users"
-    headers = {"Content-Type": "application/json", "User-Agent": "DiscordRobloxBot/1.0"}
-    for chunk in await chunked(list(user_ids), 100):
-        async with http_session.post(url, headers=headers, json={"userIds": chunk}) as resp:
-            if resp.status != 200:
-                continue
-            data = await resp.json()
-            for u in data.get("data", []):
-                res[int(u.get("id"))] = u.get("name") or u.get("displayName") or str(u.get("id"))
-    return res
-
-# ------------------ Core task: update status message ------------------
+    headers = {"Content-Type": "application/json"}
+    for chunk in chunked(missing, 100):
+        status, data = await _req("POST", url, headers=headers, json={"userIds": chunk})
+        if data is None:
+            continue
+        for u in data.get("data", []):
+            name = u.get("name") or u.get("displayName") or str(u.get("id"))
+            username_cache[int(u.get("id"))] = (name, fetched_at)
+            _usernames_dirty = True
+    return {uid: username_cache[uid][0] for uid in user_ids if uid in username_cache}
+
+# ------------------ Notifications ------------------
+def queue_notif(**send_kwargs):
+    """Queue a message for the notif channel; notif_sender paces the actual sends."""
+    try:
+        notif_queue.put_nowait(send_kwargs)
+    except asyncio.QueueFull:
+        log.warning("Notif queue full, dropping notification")
+
+@tasks.loop(seconds=0)
+async def notif_sender():
+    send_kwargs = await notif_queue.get()
+    ch = bot.get_channel(NOTIF_CHANNEL_ID)
+    if ch is None:
+        log.warning("Notif channel not found, dropping notification")
+        return
+    try:
+        await ch.send(**send_kwargs)
+    except Exception as e:
+        log.warning(f"Failed to send notif: {e}")
+    await asyncio.sleep(NOTIF_SEND_GAP)
+
+# ------------------ Status box rendering ------------------
+def _render_status_box(snapshot) -> str:
+    """Build the status box text from a (now, ((name, online_since, location, game_since), ...)) snapshot.
+
+    Pure function (no I/O, no globals mutated) so it can run in a worker thread.
+    """
+    now, online = snapshot
+    # prepare friend list text (sorted by name)
+    display_lines = sorted(online, key=lambda x: x[0].lower())
+    parts = []
+    for idx, (name, since, game_name, in_game_since) in enumerate(display_lines, start=1):
+        online_s = format_timedelta(now - since)
+        game_s = format_timedelta((now - in_game_since) if in_game_since else timedelta(0))
+        parts.append(f"{idx}. **{name}**\n   🕒 Online: {online_s}\n   🎯 Game: {game_name}\n   ⌛ Waktu Bermain: {game_s}\n\n")
+    friends_text = "".join(parts) or "_Tidak ada teman online_\n"
+
+    # Build status box + progress bar (WIB times)
+    uptime = now - START_TIME
+    uptime_s = format_timedelta(uptime)
+    elapsed = int(uptime.total_seconds())
+    remaining = max(RESTART_INTERVAL - elapsed, 0)
+    remaining_s = format_timedelta(timedelta(seconds=remaining))
+    progress = min(max(elapsed / RESTART_INTERVAL, 0.0), 1.0)
+    filled = int(progress * BAR_LENGTH)
+    bar = _FILL[:filled] + _EMPTY[:BAR_LENGTH - filled]
+    last_update = now.strftime("%H:%M:%S %d/%m/%Y WIB")
+
+    return _STATUS_TEMPLATE.format(
+        uptime=uptime_s,
+        online=len(display_lines),
+        last_update=last_update,
+        remaining=remaining_s,
+        bar=bar,
+        friends=friends_text,
+    )
+
+# ------------------ Core tasks: poll presences / render status message ------------------
 @tasks.loop(seconds=UPDATE_INTERVAL)
-async def update_status_message():
-    global status_message_id, last_online_set
-    if bot.is_closed():
+async def presence_poller():
+    """Fetch presences, send online/offline notifs and wake the renderer when something changed."""
+    global last_presence_hash, online_display
+    # don't spend Roblox API quota when there is nowhere to post the results
+    if bot.is_closed() or not bot.is_ready():
+        return
+    if http_session is None or http_session.closed:
         return
+    # tasks.Loop awaits each iteration before scheduling the next, so polls never overlap
     try:
         status_channel = bot.get_channel(STATUS_CHANNEL_ID)
         notif_channel = bot.get_channel(NOTIF_CHANNEL_ID)
         if status_channel is None or notif_channel is None:
             log.warning("One or more channels not found (check config.json)")
             return
+        if status_channel.guild.unavailable:
+            log.warning("Status channel guild is unavailable, skipping presence poll")
+            return
 
         # build list of monitored user ids: friends + manual tracked
         friends = await get_friends_list()
-        monitored = set(friends) | set(int(x) for x in manual_tracked)
+        monitored = set(friends) | manual_tracked
+        monitored.discard(ROBLOX_USER_ID_INT)
+
+        # presences and usernames only depend on the id list, so fetch them concurrently
+        ids = list(monitored)
+        presences_task = asyncio.create_task(get_presences(ids))
+        usernames_task = asyncio.create_task(get_usernames(ids))
         try:
-            monitored.discard(int(ROBLOX_USER_ID))
+            presences, username_map = await asyncio.gather(presences_task, usernames_task)
         except Exception:
-            pass
-
-        presences = await get_presences(list(monitored))
+            # don't leave the sibling request running unobserved
+            presences_task.cancel()
+            usernames_task.cancel()
+            raise
         presence_map = {int(p.get("userId")): p for p in presences}
 
-        # update online/game timers and prepare friend display
+        # update online/game timers, detect online/offline changes and prepare friend display
         display_lines = []
-        current_online_set = set()
-        ids_to_label = list(presence_map.keys())
-        username_map = await get_usernames(ids_to_label) if ids_to_label else {}
+        online_lines = []
+        offline_lines = []
+        now = now_wib()
 
         for uid, presence in presence_map.items():
-            uid = int(uid)
             user_presence_type = presence.get("userPresenceType", 0)
-            is_online = user_presence_type != 0
-            last_location = presence.get("lastLocation") or "Tidak bermain"
-            name = username_map.get(uid, str(uid))
-
-            now = now_wib()
-            if is_online:
-                current_online_set.add(uid)
-                if uid not in online_since:
-                    online_since[uid] = now
+            ps = state_by_uid.setdefault(uid, PresenceState())
+
+            if user_presence_type != 0:
+                name = username_map.get(uid, str(uid))
+                if not ps.was_online:
+                    ps.was_online = True
+                    ps.online_since = now
+                    online_lines.append(f"✅ **{name}** online pada {now.strftime('%H:%M:%S')}")
                 if user_presence_type == 2:
-                    if uid not in game_since:
-                        game_since[uid] = now
+                    if ps.game_since is None:
+                        ps.game_since = now
                 else:
-                    game_since.pop(uid, None)
+                    ps.game_since = None
+
+                last_location = presence.get("lastLocation") or "Tidak bermain"
+                display_lines.append((name, ps.online_since, last_location, ps.game_since))
+            elif ps.was_online:
+                name = username_map.get(uid, str(uid))
+                total_online = now - ps.online_since
+                total_game = (now - ps.game_since) if ps.game_since else timedelta(0)
+                offline_lines.append(
+                    f"❌ **{name}** offline pada {now.strftime('%H:%M:%S')}\n"
+                    f"   🕒 Online: {format_timedelta(total_online)} · 🎯 Bermain: {format_timedelta(total_game)}"
+                )
+                ps.was_online = False
+                ps.online_since = None
+                ps.game_since = None
+
+        # forget users that are no longer monitored (unfriended / !hapus), but only when the
+        # friends list is known to be current, otherwise a failed fetch would reset everyone
+        if _friends_cache["ok"]:
+            for uid in state_by_uid.keys() - monitored:
+                del state_by_uid[uid]
+
+        # one notif per poll for all online/offline changes
+        if online_lines or offline_lines:
+            embed = discord.Embed(title="Perubahan Status Teman", timestamp=now)
+            if online_lines:
+                embed.add_field(name="Baru Online", value=_embed_field_value(online_lines), inline=False)
+            if offline_lines:
+                embed.add_field(name="Baru Offline", value=_embed_field_value(offline_lines), inline=False)
+            queue_notif(embed=embed)
+
+        # only wake the renderer when who is online / where they are actually changed
+        presence_hash = hash(tuple(sorted(
+            (uid, p.get("userPresenceType", 0), p.get("lastLocation"))
+            for uid, p in presence_map.items() if p.get("userPresenceType", 0) != 0
+        )))
+        # always hand the renderer the latest lines (names may resolve later than presence changes)
+        online_display = display_lines
+        if presence_hash != last_presence_hash:
+            last_presence_hash = presence_hash
+            update_event.set()
+
+        # poll less often while nobody is online
+        interval = UPDATE_INTERVAL if display_lines else IDLE_UPDATE_INTERVAL
+        if presence_poller.seconds != interval:
+            presence_poller.change_interval(seconds=interval)
 
-                online_dur = now - online_since.get(uid, now)
-                game_dur = (now - game_since[uid]) if uid in game_since else timedelta(0)
+    except Exception as e:
+        log.exception(f"Error in presence_poller loop: {e}")
+
+@tasks.loop(seconds=0)
+async def status_renderer():
+    """Rebuild and send/edit the status message.
+
+    Runs immediately when presence_poller signals a change, otherwise every
+    STATUS_REFRESH_INTERVAL seconds to keep the timers current.
+    """
+    global status_message_id, _last_persisted_mid, last_edit_ts
+    timeout = STATUS_REFRESH_INTERVAL - (time.monotonic() - last_edit_ts)
+    if timeout > 0:
+        try:
+            await asyncio.wait_for(update_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    update_event.clear()
+    last_edit_ts = time.monotonic()
+    try:
+        status_channel = bot.get_channel(STATUS_CHANNEL_ID)
+        if status_channel is None:
+            return
 
-                display_lines.append((name, format_timedelta(online_dur), last_location, format_timedelta(game_dur)))
-            else:
-                if uid in last_online_set:
-                    was_online_since = online_since.pop(uid, None)
-                    was_game_since = game_since.pop(uid, None)
-                    if was_online_since:
-                        total_online = now - was_online_since
-                    else:
-                        total_online = timedelta(0)
-                    total_game = (now - was_game_since) if was_game_since else timedelta(0)
-                    try:
-                        await notif_channel.send(
-                            f"❌ **{name}** offline pada {now.strftime('%H:%M:%S %d/%m/%Y WIB')}\\n"
-                            f"   🕒 Total Online: {format_timedelta(total_online)}\\n"
-                            f"   🎯 Total Bermain: {format_timedelta(total_game)}"
-                        )
-                    except Exception as e:
-                        log.warning(f"Failed to send offline notif: {e}")
-
-        # detect new online users (send online notif)
-        new_online = current_online_set - last_online_set
-        for uid in new_online:
-            name = username_map.get(uid, str(uid))
-            t = now_wib()
-            try:
-                await notif_channel.send(f"✅ **{name}** baru saja online pada {t.strftime('%H:%M:%S %d/%m/%Y WIB')}")
-            except Exception as e:
-                log.warning(f"Failed to send online notif: {e}")
-
-        # prepare friend list text (sorted by name)
-        display_lines.sort(key=lambda x: x[0].lower())
-        friends_text = ""
-        for idx, (name, online_s, game_name, game_s) in enumerate(display_lines, start=1):
-            friends_text += f"{idx}. **{name}**\\n   🕒 Online: {online_s}\\n   🎯 Game: {game_name}\\n   ⌛ Waktu Bermain: {game_s}\\n\\n"
-        if not friends_text:
-            friends_text = "_Tidak ada teman online_\\n"
-
-        # Build status box + progress bar (WIB times)
-        now = now_wib()
-        uptime = now - START_TIME
-        uptime_s = format_timedelta(uptime)
-        elapsed = int(uptime.total_seconds())
-        remaining = max(RESTART_INTERVAL - elapsed, 0)
-        remaining_s = format_timedelta(timedelta(seconds=remaining))
-        progress = min(max(elapsed / RESTART_INTERVAL, 0.0), 1.0)
-        filled = int(progress * BAR_LENGTH)
-        bar = "█" * filled + "░" * (BAR_LENGTH - filled)
-        last_update = now.strftime("%H:%M:%S %d/%m/%Y WIB")
-
-        status_box = (
-            "╔════════════ 📊 STATUS BOT ════════════╗\\n"
-            f"║ ⏳ Uptime        : {uptime_s:<20}║\\n"
-            f"║ 👥 Teman Online  : {len(display_lines):<20}║\\n"
-            f"║ 🕒 Update Terakhir: {last_update:<20}║\\n"
-            f"║ 🔄 Restart Dalam : {remaining_s:<20}║\\n"
-            f"║ [{bar}]                 ║\\n"
-            "╚═══════════════════════════════════════╝\\n\\n"
-            f"🎮 **DAFTAR TEMAN ONLINE**\\n{friends_text}"
-        )
+        # rendering is pure CPU; keep large friend lists off the event loop
+        snapshot = (now_wib(), tuple(online_display))
+        if len(snapshot[1]) > RENDER_OFFLOAD_THRESHOLD:
+            status_box = await asyncio.to_thread(_render_status_box, snapshot)
+        else:
+            status_box = _render_status_box(snapshot)
 
         # send or edit status message
         try:
@@ -291,41 +532,63 @@ async def update_status_message():
                 sent = await status_channel.send(content=f"```{status_box}```")
                 status_message_id = sent.id
 
-            # persist status_message_id
-            state["status_message_id"] = status_message_id
-            with open(STATE_PATH, "w") as f:
-                json.dump(state, f)
+            # persist status_message_id (only when it changed, off the event loop)
+            if status_message_id != _last_persisted_mid:
+                state["status_message_id"] = status_message_id
+                await asyncio.to_thread(_write_json_atomic, STATE_PATH, state)
+                _last_persisted_mid = status_message_id
         except Exception as e:
             log.warning(f"Failed to send/update status message: {e}")
 
-        # update last_online_set
-        last_online_set.clear()
-        last_online_set.update(current_online_set)
+    except Exception as e:
+        log.exception(f"Error in status_renderer loop: {e}")
 
+# ------------------ Username cache persistence ------------------
+async def flush_usernames():
+    """Write username_cache to USERNAMES_PATH if it has unsaved entries."""
+    global _usernames_dirty
+    if not _usernames_dirty:
+        return
+    _usernames_dirty = False
+    try:
+        await asyncio.to_thread(_write_json_atomic, USERNAMES_PATH, dict(username_cache))
     except Exception as e:
-        log.exception(f"Error in update_status_message loop: {e}")
+        _usernames_dirty = True
+        log.warning(f"Failed to persist username cache: {e}")
+
+@tasks.loop(minutes=10)
+async def persist_usernames():
+    await flush_usernames()
 
 # ------------------ Auto restart task ------------------
-@tasks.loop(seconds=1)
-async def auto_restart_check():
+async def _announce_restart(text):
+    """Post a restart announcement; failures are only logged so the restart still happens."""
+    ch = bot.get_channel(NOTIF_CHANNEL_ID)
+    if not ch:
+        return
     try:
-        now = now_wib()
-        uptime = now - START_TIME
-        elapsed = int(uptime.total_seconds())
-        # 5 minutes warning
-        if RESTART_INTERVAL - elapsed <= 300 and RESTART_INTERVAL - elapsed > 295:
-            ch = bot.get_channel(NOTIF_CHANNEL_ID)
-            if ch:
-                await ch.send("⚠️ Bot akan restart otomatis dalam 5 menit!")
-        if elapsed >= RESTART_INTERVAL:
-            ch = bot.get_channel(NOTIF_CHANNEL_ID)
-            if ch:
-                await ch.send("♻️ Bot sedang restart otomatis... Bot akan kembali aktif dalam ~1 menit.")
-            await asyncio.sleep(1)
-            log.info("Performing automatic restart (execv)")
-            os.execv(sys.executable, [sys.executable] + sys.argv)
+        await ch.send(text)
+    except Exception as e:
+        log.warning(f"Failed to send restart announcement: {e}")
+
+async def _schedule_restart():
+    """Sleep until the 5 minute warning, post it, then sleep until RESTART_INTERVAL and restart."""
+    try:
+        elapsed = (now_wib() - START_TIME).total_seconds()
+        await asyncio.sleep(max(RESTART_INTERVAL - RESTART_WARNING - elapsed, 0))
+        await _announce_restart("⚠️ Bot akan restart otomatis dalam 5 menit!")
+        elapsed = (now_wib() - START_TIME).total_seconds()
+        await asyncio.sleep(max(RESTART_INTERVAL - elapsed, 0))
+        await _announce_restart("♻️ Bot sedang restart otomatis... Bot akan kembali aktif dalam ~1 menit.")
+        await asyncio.sleep(1)
+        log.info("Performing automatic restart (execvp)")
+        await flush_usernames()
+        await close_http_session()
+        os.execvp(sys.executable, [sys.executable] + sys.argv)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        log.exception(f"Error in auto_restart_check: {e}")
+        log.exception(f"Error in _schedule_restart: {e}")
 
 # ------------------ Commands ------------------
 @bot.command(name="add")
@@ -333,21 +596,24 @@ async def auto_restart_check():
 async def cmd_add(ctx, user_id: int):
     if user_id in manual_tracked:
         return await ctx.send("⚠️ User sudah ada di daftar.")
-    manual_tracked.append(user_id)
-    with open(PLAYERS_PATH, "w") as f:
-        json.dump(manual_tracked, f, indent=2)
+    manual_tracked.add(user_id)
+    await asyncio.to_thread(_write_json_atomic, PLAYERS_PATH, sorted(manual_tracked), indent=2)
     await ctx.send(f"✅ User `{user_id}` ditambahkan ke daftar pantauan.")
 
 @bot.command(name="hapus")
 @commands.has_permissions(administrator=True)
 async def cmd_hapus(ctx, user_id: int):
-    try:
-        manual_tracked.remove(user_id)
-        with open(PLAYERS_PATH, "w") as f:
-            json.dump(manual_tracked, f, indent=2)
-        await ctx.send(f"🗑️ User `{user_id}` dihapus dari daftar pantauan.")
-    except ValueError:
-        await ctx.send("⚠️ User tidak ditemukan di daftar.")
+    if user_id not in manual_tracked:
+        return await ctx.send("⚠️ User tidak ditemukan di daftar.")
+    manual_tracked.discard(user_id)
+    await asyncio.to_thread(_write_json_atomic, PLAYERS_PATH, sorted(manual_tracked), indent=2)
+    await ctx.send(f"🗑️ User `{user_id}` dihapus dari daftar pantauan.")
+
+@bot.command(name="refreshfriends")
+@commands.has_permissions(administrator=True)
+async def cmd_refreshfriends(ctx):
+    _friends_cache["expires"] = 0.0
+    await ctx.send("🔄 Daftar teman akan diperbarui pada update berikutnya.")
 
 @bot.command(name="resetbot")
 @commands.has_permissions(administrator=True)
@@ -360,19 +626,35 @@ async def cmd_resetbot(ctx):
         await ch.send(f"🔄 Bot diminta restart oleh {author} — Bot akan kembali aktif dalam ~1 menit.")
     await asyncio.sleep(1)
     log.info(f"Manual restart by {author}")
-    os.execv(sys.executable, [sys.executable] + sys.argv)
+    await flush_usernames()
+    await close_http_session()
+    os.execvp(sys.executable, [sys.executable] + sys.argv)
 
 # ------------------ Events ------------------
 @bot.event
 async def on_ready():
-    global http_session
+    global http_session, restart_task
     log.info(f"Logged in as {bot.user} (id: {bot.user.id})")
-    http_session = aiohttp.ClientSession()
+    # on_ready can fire again after a reconnect; keep the existing pooled session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=20, limit_per_host=8, ttl_dns_cache=300, keepalive_timeout=75, enable_cleanup_closed=True
+        )
+        timeout = aiohttp.ClientTimeout(total=15, connect=5)
+        http_session = aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers={"User-Agent": "DiscordRobloxBot/1.0"}
+        )
     # start tasks
-    if not update_status_message.is_running():
-        update_status_message.start()
-    if not auto_restart_check.is_running():
-        auto_restart_check.start()
+    if not notif_sender.is_running():
+        notif_sender.start()
+    if not presence_poller.is_running():
+        presence_poller.start()
+    if not status_renderer.is_running():
+        status_renderer.start()
+    if not persist_usernames.is_running():
+        persist_usernames.start()
+    if restart_task is None:
+        restart_task = asyncio.create_task(_schedule_restart())
 
 @bot.event
 async def on_disconnect():